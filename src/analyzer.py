@@ -1,46 +1,180 @@
 import json
 import os
-import io
+import re
+import time
+import hashlib
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 import boto3
+import orjson
+from botocore.config import Config
 import pandas as pd
-from jinja2 import Template
-from pydantic import BaseModel, Field
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
 
 
 # ================== Logging Setup ==================
 logger = logging.getLogger()
 logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
+# ================== Input Config ==================
+# Columns combined into the text sent for classification
+TEXT_COLUMNS = ["Title", "Post_Text", "Body", "content"]
+PARQUET_BATCH_SIZE = int(os.environ.get("PARQUET_BATCH_SIZE", "1024"))
+# Output rows buffered before a row group is flushed to S3
+OUTPUT_ROW_GROUP_SIZE = int(os.environ.get("OUTPUT_ROW_GROUP_SIZE", "10000"))
+CLASSIFICATION_SCHEMA = pa.schema([("combined_text", pa.string()), ("category", pa.string())])
+# Only files uploaded within this many days are classified; overridable per event with "days_back"
+ANALYSIS_DAYS_BACK = int(os.environ.get("ANALYSIS_DAYS_BACK", "7"))
+# Number of parquet files downloaded/classified/uploaded at the same time
+FILE_CONCURRENCY = int(os.environ.get("FILE_CONCURRENCY", "8"))
+
+# ================== Bedrock Config =================
+BEDROCK_MODEL_ID = os.environ.get(
+    "BEDROCK_MODEL_ID",
+    "us.anthropic.claude-sonnet-4-5-20250929-v1:0"
+)
+# Number of concurrent Bedrock invocations; keep within the model's TPS/RPM quota
+BEDROCK_CONCURRENCY = int(os.environ.get("BEDROCK_CONCURRENCY", "8"))
+# A category label is a handful of tokens; no need to allow long generations
+MAX_TOKENS = int(os.environ.get("MAX_TOKENS", "16"))
+# Posts are truncated before templating; the opening is enough to classify
+MAX_INPUT_CHARS = int(os.environ.get("MAX_INPUT_CHARS", "2000"))
+# Posts with less text than this (ignoring "[removed]"/"[deleted]") are labelled "unknown" without a call
+MIN_CLASSIFY_CHARS = int(os.environ.get("MIN_CLASSIFY_CHARS", "10"))
+# Posts sent per Bedrock call; 1 disables multi-post prompts
+CLASSIFY_BATCH_SIZE = int(os.environ.get("CLASSIFY_BATCH_SIZE", "10"))
+# Generation budget per post in a batch; an entry like {"id": 10, "category": "Mental Health
+# and Wellbeing"}, is ~20 tokens, and reading stops at "]" so unused headroom isn't billed
+BATCH_TOKENS_PER_POST = int(os.environ.get("BATCH_TOKENS_PER_POST", "40"))
+
 # ================== AWS Clients ===================
-s3_client = boto3.client('s3')
-bedrock_client = boto3.client(
-    'bedrock-runtime',
-    region_name=os.environ.get("BEDROCK_REGION", os.environ.get("AWS_REGION", "us-west-2"))
+# Shared by all clients: keep-alive connections survive between warm invocations.
+# Every Bedrock worker thread needs its own pooled connection, otherwise urllib3
+# makes the extra threads wait and the effective concurrency silently drops.
+BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    connect_timeout=2,
+    read_timeout=30,
+    retries={"mode": "adaptive", "max_attempts": 10},
+    max_pool_connections=max(64, BEDROCK_CONCURRENCY)
 )
 
 bucket_name = os.environ.get("BUCKET_NAME")
 bedrock_region = os.environ.get("BEDROCK_REGION", os.environ.get("AWS_REGION", "us-west-2"))
 
-# ================== Bedrock Config =================
-BEDROCK_MODEL_ID = os.environ.get(
-    "BEDROCK_MODEL_ID",
-    "us.anthropic.claude-sonnet-4-5-20250929-v1:0"
+# Clients are created on first use rather than at import, so cold starts only pay
+# for the ones a run needs. boto3's default session isn't thread-safe, hence the lock.
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    with _client_lock:
+        return boto3.client('s3', config=BOTO_CONFIG)
+
+
+@lru_cache(maxsize=None)
+def get_bedrock_client():
+    with _client_lock:
+        return boto3.client('bedrock-runtime', region_name=bedrock_region, config=BOTO_CONFIG)
+
+
+@lru_cache(maxsize=None)
+def get_dynamodb_client():
+    """DynamoDB client for the response cache, or None when no table is configured."""
+    if not RESPONSE_CACHE_TABLE:
+        return None
+    with _client_lock:
+        return boto3.client('dynamodb', config=BOTO_CONFIG)
+
+
+@lru_cache(maxsize=None)
+def get_s3_fs() -> pafs.S3FileSystem:
+    # Arrow's S3 filesystem issues ranged GETs, so parquet can be read without buffering whole objects
+    return pafs.S3FileSystem(region=os.environ.get("AWS_REGION", "us-west-2"))
+
+
+# ================== Response Cache =================
+# Optional DynamoDB table (partition key "prompt_hash", TTL attribute "expires_at")
+# backing the in-process cache so identical prompts are only billed once.
+RESPONSE_CACHE_TABLE = os.environ.get("RESPONSE_CACHE_TABLE")
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# In-process tier, keyed by prompt hash only: batch prompts run to ~20 KB and rarely
+# repeat, so keeping the prompts themselves would just hold memory across warm invocations
+RESPONSE_CACHE_SIZE = 4096
+_response_cache: "OrderedDict[str, str]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# Category per (model, post text) kept as small objects in the data bucket, so posts
+# that show up again in later runs' lookback window aren't classified again.
+# Set CATEGORY_CACHE_PREFIX to an empty string to disable.
+CATEGORY_CACHE_PREFIX = os.environ.get("CATEGORY_CACHE_PREFIX", "cache/categories/")
+CATEGORY_CACHE_TTL_SECONDS = int(os.environ.get("CATEGORY_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Model id fragments of the families that support Bedrock prompt caching
+PROMPT_CACHE_MODEL_FAMILIES = (
+    "anthropic.claude-3-5-haiku", "anthropic.claude-3-7-sonnet",
+    "anthropic.claude-sonnet-4", "anthropic.claude-opus-4", "anthropic.claude-haiku-4",
+    "amazon.nova-micro", "amazon.nova-lite", "amazon.nova-pro", "amazon.nova-premier"
 )
+# Prefixes under the minimum cacheable length (~1024 tokens) aren't cached, so no cache point
+# is added for them. The bundled classification prompts (~120 tokens) are well below it.
+PROMPT_CACHE_MIN_CHARS = int(os.environ.get("PROMPT_CACHE_MIN_CHARS", "4096"))
+
+_cache_stats_lock = threading.Lock()
+_cache_stats = {"response_cache_hits": 0, "response_cache_misses": 0, "dynamodb_hits": 0,
+                "prompt_cache_read_tokens": 0, "category_cache_hits": 0}
+
+# Placeholder rendered in place of the post so the template can be split into
+# a static prefix (shared by every row) and a per-row suffix
+CONTENT_MARKER = "\x00content\x00"
 
 # ================== Structured Output Models =======
-class CategoryResponse(BaseModel):
-    category: str = Field(description="Predicted category name from the predefined list.")
+@dataclass(slots=True)
+class CategoryResponse:
+    # Plain slotted dataclass: built once per post, so pydantic validation is avoided
+    category: str  # Predicted category name from the predefined list.
 
 
 # ================== Helper Functions ==============
-def render_prompt(prompt_file: str, content: str) -> str:
+# Matches the only placeholder the literal fast path knows how to fill
+CONTENT_PLACEHOLDER_RE = re.compile(r"\{\{\s*content\s*\}\}")
+
+# Category names offered by the classification prompts
+CATEGORIES = [
+    "Computer Science", "Math and Statistics", "General Sciences", "Arts and Humanities",
+    "Business and Econ", "General Academics", "Advice and Tips", "Social", "Rants",
+    "Mental Health and Wellbeing", "Housing and Residence", "Campus Spaces", "Career",
+    "Admin and Logistics", "unknown"
+]
+# Finds the first category named in a free-text reply in a single pass
+CATEGORY_RE = re.compile(
+    r"\b(" + "|".join(re.escape(c) for c in sorted(CATEGORIES, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+CATEGORY_BY_LOWER = {c.lower(): c for c in CATEGORIES}
+
+# Reddit's placeholders for removed/deleted text, plus the separators between columns
+LOW_SIGNAL_RE = re.compile(r"\[(?:removed|deleted)\]|[\s.]+")
+
+_json_decoder = json.JSONDecoder()
+
+
+@lru_cache(maxsize=8)
+def _read_prompt_source(prompt_file: str) -> str:
     """
-    Render Jinja2 prompt template located under src/prompts/.
+    Read a prompt template located under src/prompts/.
     Handles both local and deployed Lambda directory structures.
+    Cached so the path search happens once per container.
     """
     base_dir = os.path.dirname(__file__)
     possible_paths = [
@@ -52,39 +186,308 @@ def render_prompt(prompt_file: str, content: str) -> str:
 
     for path in possible_paths:
         if os.path.exists(path):
-            logger.info(f"Using prompt file: {path}")
+            logger.info("Using prompt file: %s", path)
             with open(path, "r", encoding="utf-8") as f:
-                template = Template(f.read())
-            return template.render(content=content)
+                return f.read()
 
     raise FileNotFoundError(f"Prompt file not found. Tried paths: {possible_paths}")
 
 
-def invoke_bedrock_model(prompt: str, model_id: str = BEDROCK_MODEL_ID) -> str:
-    """Invoke Bedrock model directly with boto3."""
-    if model_id.startswith("anthropic.claude"):
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "messages": [{"role": "user", "content": prompt}]
-        })
-    else:
-        body = json.dumps({"prompt": prompt, "max_gen_len": 1000})
-    
-    response = bedrock_client.invoke_model(
-        modelId=model_id,
-        body=body,
-        contentType="application/json"
-    )
-    
-    result = json.loads(response['body'].read())
-    
-    if model_id.startswith("anthropic.claude"):
-        return result['content'][0]['text']
-    elif model_id.startswith("meta.llama"):
-        return result['generation']
-    else:
-        return str(result)
+@lru_cache(maxsize=8)
+def _load_template(prompt_file: str):
+    """
+    Compile a prompt template once per container.
+    Jinja is imported here rather than at module load because the bundled
+    templates take the literal fast path, so cold starts never need it.
+    """
+    from jinja2 import Template
+    return Template(_read_prompt_source(prompt_file))
+
+
+@lru_cache(maxsize=8)
+def _literal_template_parts(prompt_file: str) -> Optional[Tuple[str, str]]:
+    """
+    Text before and after the placeholder when the template is plain text
+    with a single {{ content }}, or None if it needs Jinja to render.
+    """
+    # Mirror Jinja's defaults: newlines normalised, one trailing newline dropped
+    source = _read_prompt_source(prompt_file).replace("\r\n", "\n").replace("\r", "\n")
+    if source.endswith("\n"):
+        source = source[:-1]
+    parts = CONTENT_PLACEHOLDER_RE.split(source)
+    if len(parts) != 2 or any(tag in part for part in parts for tag in ("{{", "{%", "{#")):
+        return None
+    return parts[0], parts[1]
+
+
+def render_prompt(prompt_file: str, content: str) -> str:
+    """Render a prompt template from src/prompts/ with the given content."""
+    parts = _literal_template_parts(prompt_file)
+    if parts:
+        head, tail = parts
+        return f"{head}{content}{tail}"
+    return _load_template(prompt_file).render(content=content)
+
+
+@lru_cache(maxsize=8)
+def _split_prompt(prompt_file: str) -> Tuple[str, str]:
+    """Render the prompt once and split it around the content placeholder."""
+    rendered = render_prompt(prompt_file, CONTENT_MARKER)
+    prefix, _, tail = rendered.partition(CONTENT_MARKER)
+    return prefix, tail
+
+
+def render_static_prefix(prompt_file: str) -> str:
+    """Static part of the prompt preceding the post content (instructions, category list)."""
+    return _split_prompt(prompt_file)[0]
+
+
+def user_suffix(prompt_file: str, content: str) -> str:
+    """Per-row part of the prompt: the post content plus the template tail."""
+    tail = _split_prompt(prompt_file)[1]
+    return f"{content}{tail}\n\nRespond with JSON format: {{\"category\": \"category_name\"}}"
+
+
+def get_cached_response(prompt_hash: str) -> Optional[str]:
+    """Look up a stored model response in the DynamoDB cache table, if configured."""
+    dynamodb_client = get_dynamodb_client()
+    if not dynamodb_client:
+        return None
+    try:
+        item = dynamodb_client.get_item(
+            TableName=RESPONSE_CACHE_TABLE,
+            Key={"prompt_hash": {"S": prompt_hash}}
+        ).get("Item")
+    except Exception as e:
+        logger.warning("Response cache lookup failed: %s", e)
+        return None
+    # DynamoDB deletes expired items lazily, so check the TTL ourselves
+    if not item or int(item["expires_at"]["N"]) < time.time():
+        return None
+    with _cache_stats_lock:
+        _cache_stats["dynamodb_hits"] += 1
+    return item["response"]["S"]
+
+
+def put_cached_response(prompt_hash: str, response_text: str):
+    """Store a model response in the DynamoDB cache table, if configured."""
+    dynamodb_client = get_dynamodb_client()
+    if not dynamodb_client:
+        return
+    try:
+        dynamodb_client.put_item(
+            TableName=RESPONSE_CACHE_TABLE,
+            Item={
+                "prompt_hash": {"S": prompt_hash},
+                "response": {"S": response_text},
+                "expires_at": {"N": str(int(time.time()) + RESPONSE_CACHE_TTL_SECONDS)}
+            }
+        )
+    except Exception as e:
+        logger.warning("Response cache write failed: %s", e)
+
+
+@lru_cache(maxsize=8)
+def prompt_fingerprint(*prompt_files: str) -> str:
+    """Hash of the prompt sources, so editing a prompt invalidates the categories cached under it."""
+    digest = hashlib.sha256()
+    for prompt_file in prompt_files:
+        digest.update(_read_prompt_source(prompt_file).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def category_cache_key(text: str, model_id: str, prompt_version: str) -> str:
+    """S3 key of the cached category for a post text classified by model_id with the given prompts."""
+    digest = hashlib.sha256(f"{model_id}|{prompt_version}|{text}".encode("utf-8")).hexdigest()
+    return f"{CATEGORY_CACHE_PREFIX}{digest}.json"
+
+
+def known_category(value: Any) -> Optional[str]:
+    """Canonical spelling of a category name, or None if value isn't one of CATEGORIES."""
+    return CATEGORY_BY_LOWER.get(value.lower()) if isinstance(value, str) else None
+
+
+def get_cached_category(text: str, model_id: str, prompt_version: str) -> Optional[str]:
+    """Look up a previously stored category for this text, if it hasn't expired."""
+    if not CATEGORY_CACHE_PREFIX:
+        return None
+    try:
+        obj = get_s3_client().get_object(Bucket=bucket_name, Key=category_cache_key(text, model_id, prompt_version))
+        age = datetime.now(obj["LastModified"].tzinfo) - obj["LastModified"]
+        if age.total_seconds() > CATEGORY_CACHE_TTL_SECONDS:
+            return None
+        cached = orjson.loads(obj["Body"].read())
+    except get_s3_client().exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        # A timed-out read or corrupt object is treated as a miss rather than failing the file
+        logger.warning("Category cache lookup failed: %s", e)
+        return None
+    category = known_category(cached.get("category")) if isinstance(cached, dict) else None
+    if category:
+        with _cache_stats_lock:
+            _cache_stats["category_cache_hits"] += 1
+    return category
+
+
+def put_cached_category(text: str, model_id: str, prompt_version: str, category: str):
+    """Store the category assigned to this text."""
+    if not CATEGORY_CACHE_PREFIX:
+        return
+    try:
+        get_s3_client().put_object(
+            Bucket=bucket_name,
+            Key=category_cache_key(text, model_id, prompt_version),
+            Body=orjson.dumps({"category": category}),
+            ContentType="application/json"
+        )
+    except Exception as e:
+        logger.warning("Category cache write failed: %s", e)
+
+
+def invoke_bedrock_model(prompt: str, model_id: str = BEDROCK_MODEL_ID,
+                         system_prefix: Optional[str] = None,
+                         stop_at: Optional[str] = None,
+                         max_tokens: int = MAX_TOKENS) -> str:
+    """
+    Invoke Bedrock model, short-circuiting identical prompts.
+    Responses are cached in-process (reused across warm invocations) and,
+    when RESPONSE_CACHE_TABLE is set, in DynamoDB.
+    """
+    prompt_hash = hashlib.sha256(
+        f"{model_id}|{system_prefix or ''}|{prompt}".encode("utf-8")
+    ).hexdigest()
+    with _response_cache_lock:
+        response_text = _response_cache.get(prompt_hash)
+        if response_text is not None:
+            _response_cache.move_to_end(prompt_hash)
+    with _cache_stats_lock:
+        _cache_stats["response_cache_hits" if response_text is not None else "response_cache_misses"] += 1
+    if response_text is not None:
+        return response_text
+
+    response_text = get_cached_response(prompt_hash)
+    if response_text is None:
+        response_text = _invoke_bedrock_model_uncached(prompt, model_id, system_prefix, stop_at, max_tokens)
+        put_cached_response(prompt_hash, response_text)
+    with _response_cache_lock:
+        _response_cache[prompt_hash] = response_text
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    return response_text
+
+
+def supports_prompt_caching(model_id: str) -> bool:
+    """Whether the model accepts Converse cachePoint blocks (older Claude models reject them)."""
+    return any(family in model_id for family in PROMPT_CACHE_MODEL_FAMILIES)
+
+
+@lru_cache(maxsize=32)
+def _converse_request_base(model_id: str, system_prefix: Optional[str],
+                           max_tokens: int = MAX_TOKENS) -> Dict[str, Any]:
+    """
+    Static part of a ConverseStream request, built once per model and prefix.
+    Shared between threads, so callers copy it instead of mutating it.
+    """
+    request = {
+        "modelId": model_id,
+        "inferenceConfig": {"maxTokens": max_tokens}
+    }
+    if system_prefix and "amazon.titan" not in model_id:
+        request["system"] = [{"text": system_prefix}]
+        if supports_prompt_caching(model_id) and len(system_prefix) >= PROMPT_CACHE_MIN_CHARS:
+            request["system"].append({"cachePoint": {"type": "default"}})
+    return request
+
+
+def _invoke_bedrock_model_uncached(prompt: str, model_id: str,
+                                   system_prefix: Optional[str] = None,
+                                   stop_at: Optional[str] = None,
+                                   max_tokens: int = MAX_TOKENS) -> str:
+    """
+    Invoke Bedrock model through the model-agnostic ConverseStream API.
+    The static part of the prompt goes in the system message, followed by a
+    cache point when the model and prefix length allow prompt caching. If
+    stop_at is given, reading stops as soon as that text has been generated.
+    """
+    if system_prefix and "amazon.titan" in model_id:
+        # Titan text models reject system prompts
+        prompt = system_prefix + prompt
+    request = {
+        **_converse_request_base(model_id, system_prefix, max_tokens),
+        "messages": [{"role": "user", "content": [{"text": prompt}]}]
+    }
+
+    stream = get_bedrock_client().converse_stream(**request)["stream"]
+    chunks = []
+    try:
+        for event in stream:
+            if "contentBlockDelta" in event:
+                text = event["contentBlockDelta"]["delta"].get("text", "")
+                chunks.append(text)
+                if stop_at and stop_at in text:
+                    break
+            elif "metadata" in event:
+                # Only sent once generation finishes, so early exits skip it
+                cache_read_tokens = event["metadata"].get("usage", {}).get("cacheReadInputTokens", 0)
+                if cache_read_tokens:
+                    with _cache_stats_lock:
+                        _cache_stats["prompt_cache_read_tokens"] += cache_read_tokens
+    finally:
+        stream.close()
+
+    return "".join(chunks)
+
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the first complete JSON object embedded in text, e.g. after a preamble.
+    raw_decode stops at the end of the object, so trailing prose or stray
+    braces later in the reply don't matter.
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = _json_decoder.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(obj, dict):
+            return obj
+        start = text.find("{", start + 1)
+    return None
+
+
+def extract_json_items(text: str) -> List[Any]:
+    """
+    Return the entries of the first JSON array of objects embedded in text,
+    e.g. inside a ```json fence or after a preamble. If the array is cut off,
+    the complete objects before the cut are returned.
+    """
+    start = text.find("[")
+    first = start
+    while start != -1:
+        try:
+            items, _ = _json_decoder.raw_decode(text, start)
+        except ValueError:
+            items = None
+        if isinstance(items, list) and any(isinstance(item, dict) for item in items):
+            return items
+        start = text.find("[", start + 1)
+    # No complete array: recover the objects one by one
+    items = []
+    pos = text.find("{", max(first, 0))
+    while pos != -1:
+        try:
+            item, end = _json_decoder.raw_decode(text, pos)
+        except ValueError:
+            pos = text.find("{", pos + 1)
+            continue
+        if isinstance(item, dict):
+            items.append(item)
+        pos = text.find("{", end)
+    return items
 
 
 def classify_text(content: str, model_id: str, prompt_file: str) -> CategoryResponse:
@@ -92,46 +495,285 @@ def classify_text(content: str, model_id: str, prompt_file: str) -> CategoryResp
     Classify text using a Bedrock model with Jinja2 prompts.
     Automatically resolves prompt from src/prompts/.
     """
-    rendered_prompt = render_prompt(prompt_file, content)
-    full_prompt = f"{rendered_prompt}\n\nRespond with JSON format: {{\"category\": \"category_name\"}}"
-
-    output_text = invoke_bedrock_model(full_prompt, model_id)
+    content = content[:MAX_INPUT_CHARS]
+    output_text = invoke_bedrock_model(
+        user_suffix(prompt_file, content),
+        model_id,
+        system_prefix=render_static_prefix(prompt_file),
+        stop_at="}"
+    )
 
     try:
-        result = json.loads(output_text.strip())
+        result = orjson.loads(output_text.strip())
+    except orjson.JSONDecodeError:
+        result = None
+    # CategoryResponse doesn't validate, so a null or numeric category must not get through
+    if isinstance(result, dict) and isinstance(result.get("category", "Unknown"), str):
         return CategoryResponse(category=result.get("category", "Unknown"))
-    except Exception:
-        cleaned = output_text.strip().split("\n")[0]
-        return CategoryResponse(category=cleaned)
+    result = extract_json_object(output_text)
+    if result and isinstance(result.get("category"), str):
+        return CategoryResponse(category=result["category"])
+    match = CATEGORY_RE.search(output_text)
+    if match:
+        return CategoryResponse(category=CATEGORY_BY_LOWER[match.group(1).lower()])
+    cleaned = output_text.strip().split("\n")[0]
+    return CategoryResponse(category=cleaned)
+
+
+def classify_texts(contents: List[str], model_id: str, prompt_file: str,
+                   batch_prompt_file: str) -> List[CategoryResponse]:
+    """
+    Classify several texts with a single Bedrock call.
+    The model is asked for a JSON array of {"id", "category"} objects and the
+    replies are matched back to posts by id, so a dropped or reordered entry
+    doesn't shift the rest. Posts the reply doesn't cover are classified on
+    their own with prompt_file.
+    """
+    if len(contents) == 1:
+        return [classify_text(contents[0], model_id, prompt_file)]
+
+    _, tail = _split_prompt(batch_prompt_file)
+    posts = "\n\n".join(
+        f"Post {i}:\n{content[:MAX_INPUT_CHARS]}" for i, content in enumerate(contents, 1)
+    )
+    output_text = invoke_bedrock_model(
+        f"{posts}{tail}",
+        model_id,
+        system_prefix=render_static_prefix(batch_prompt_file),
+        stop_at="]",
+        max_tokens=MAX_TOKENS + BATCH_TOKENS_PER_POST * len(contents)
+    )
+
+    categories: Dict[int, str] = {}
+    for result in extract_json_items(output_text):
+        if not isinstance(result, dict):
+            continue
+        post_id, category = result.get("id"), result.get("category")
+        if isinstance(post_id, int) and 1 <= post_id <= len(contents) and isinstance(category, str):
+            categories.setdefault(post_id, category)
+
+    if len(categories) < len(contents):
+        logger.warning("Batch classification covered %d of %d posts, "
+                       "classifying the rest one at a time", len(categories), len(contents))
+    return [
+        CategoryResponse(category=categories[i]) if i in categories
+        else classify_text(content, model_id, prompt_file)
+        for i, content in enumerate(contents, 1)
+    ]
+
+
+def classify_and_cache(contents: List[str], model_id: str, prompt_file: str,
+                       batch_prompt_file: str) -> List[CategoryResponse]:
+    """
+    Classify a chunk of texts and store each category in the category cache.
+    Only known category names are cached; an unparseable reply is left to be
+    retried on the next run rather than pinned for the cache's lifetime.
+    "unknown" isn't cached either, since it's also the default for a reply
+    without a category.
+    """
+    category_responses = classify_texts(contents, model_id, prompt_file, batch_prompt_file)
+    prompt_version = prompt_fingerprint(prompt_file, batch_prompt_file)
+    for content, category_response in zip(contents, category_responses):
+        category = known_category(category_response.category)
+        if category and category != "unknown":
+            put_cached_category(content, model_id, prompt_version, category)
+    return category_responses
+
+
+def cache_counters() -> Dict[str, int]:
+    """Snapshot of cumulative response cache counters for this container."""
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+    return {
+        "ResponseCacheHits": stats["response_cache_hits"],
+        "ResponseCacheMisses": stats["response_cache_misses"],
+        "DynamoDBCacheHits": stats["dynamodb_hits"],
+        "CategoryCacheHits": stats["category_cache_hits"],
+        "PromptCacheReadTokens": stats["prompt_cache_read_tokens"]
+    }
+
+
+def emit_cache_metrics(before: Dict[str, int]):
+    """Emit per-invocation cache counters to CloudWatch using the Embedded Metric Format."""
+    after = cache_counters()
+    metrics = {name: after[name] - before.get(name, 0) for name in after}
+    # EMF lines must be bare JSON on stdout, so bypass the logger's prefix
+    print(orjson.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": "UBCRedditReporter",
+                "Dimensions": [["FunctionName"]],
+                "Metrics": [{"Name": name, "Unit": "Count"} for name in metrics]
+            }]
+        },
+        "FunctionName": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "analyzer"),
+        **metrics
+    }).decode())
 
 
 # ================== S3 & Parquet Utilities =========
-def list_parquet_files_from_s3(bucket: str, prefix: str = "raw_data/") -> List[str]:
-    """List parquet files in S3 bucket under prefix."""
+def list_parquet_files_from_s3(bucket: str, prefix: str = "raw_data/",
+                               modified_since: Optional[datetime] = None) -> List[str]:
+    """
+    List parquet files in S3 bucket under prefix.
+    If modified_since (timezone-aware) is given, older objects are skipped.
+    """
     files = []
-    paginator = s3_client.get_paginator('list_objects_v2')
-    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+    paginator = get_s3_client().get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={"PageSize": 1000}):
         for obj in page.get("Contents", []):
-            if obj["Key"].endswith(".parquet"):
-                files.append(obj["Key"])
+            if not obj["Key"].endswith(".parquet"):
+                continue
+            # LastModified is already UTC-aware, so it compares directly with the cutoff
+            if modified_since is not None and obj["LastModified"] < modified_since:
+                continue
+            files.append(obj["Key"])
     return files
 
 
-def read_parquet_from_s3(bucket: str, key: str) -> pd.DataFrame:
-    """Read parquet file from S3 into DataFrame."""
-    response = s3_client.get_object(Bucket=bucket, Key=key)
-    buffer = io.BytesIO(response['Body'].read())
-    df = pd.read_parquet(buffer, engine="pyarrow")
-    return df
+def iter_parquet_batches_from_s3(bucket: str, key: str, columns: Optional[List[str]] = None,
+                                 batch_size: int = PARQUET_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream a parquet file from S3 as DataFrames of at most batch_size rows.
+    If columns is given, only those present in the file's schema are read.
+    Arrow fetches row groups with ranged GETs, so downloading overlaps
+    decoding and the whole object is never buffered.
+    """
+    with get_s3_fs().open_input_file(f"{bucket}/{key}") as f:
+        parquet_file = pq.ParquetFile(f)
+        if columns is not None:
+            # iter_batches rejects unknown columns, so prune against the footer schema
+            available = set(parquet_file.schema_arrow.names)
+            columns = [col for col in columns if col in available]
+            if not columns:
+                logger.warning("None of the requested columns found in %s, skipping", key)
+                return
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+
+class S3ParquetWriter:
+    """
+    Write a parquet file to S3 one row group at a time.
+    Arrow's S3 output stream sends multipart upload parts in the background,
+    so uploading overlaps classification and memory stays flat. The object
+    is only created once the first row group is written.
+    """
+
+    def __init__(self, bucket: str, key: str, schema: pa.Schema):
+        self.path = f"{bucket}/{key}"
+        self.schema = schema
+        self.rows = 0
+        self._sink = None
+        self._writer = None
+
+    def write(self, table: pa.Table):
+        if self._writer is None:
+            self._sink = get_s3_fs().open_output_stream(self.path)
+            self._writer = pq.ParquetWriter(self._sink, self.schema, compression="zstd")
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        """Finish the file; completes the multipart upload."""
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            logger.info("Uploaded %d rows to s3://%s", self.rows, self.path)
+
+    def abort(self):
+        """Discard a partially written file."""
+        if self._writer is not None:
+            try:
+                self._writer.close()
+                self._sink.close()
+                get_s3_fs().delete_file(self.path)
+            except Exception as e:
+                logger.warning("Failed to clean up partial upload s3://%s: %s", self.path, e)
+
+
+def combine_text_columns(df: pd.DataFrame) -> pd.Series:
+    """Join the available text columns of each row, dropping rows with no text."""
+    text_columns = [col for col in TEXT_COLUMNS if col in df.columns]
+    # Columnar concatenation avoids a per-row Python callback
+    combined_texts = df[text_columns[0]].fillna('').astype(str)
+    for col in text_columns[1:]:
+        combined_texts = combined_texts.str.cat(df[col].fillna('').astype(str), sep='. ')
+    combined_texts = combined_texts.str.strip()
+    return combined_texts[combined_texts.str.len() > 0]
+
+
+def classification_prompt_files() -> Tuple[str, str]:
+    """Single-post and batch classification prompts, overridable with PROMPT_FILE/BATCH_PROMPT_FILE."""
+    return (os.environ.get("PROMPT_FILE", "classify_post.jinja"),
+            os.environ.get("BATCH_PROMPT_FILE", "classify_posts_batch.jinja"))
 
 
-def write_parquet_to_s3(df: pd.DataFrame, bucket: str, key: str):
-    """Write DataFrame as parquet to S3."""
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, index=False, engine="pyarrow")
-    buffer.seek(0)
-    s3_client.put_object(Bucket=bucket, Key=key, Body=buffer)
-    logger.info(f"Uploaded {len(df)} rows to s3://{bucket}/{key}")
+def is_low_signal(text: str) -> bool:
+    """True for posts with too little real text to be worth classifying."""
+    return len(LOW_SIGNAL_RE.sub("", text)) < MIN_CLASSIFY_CHARS
+
+
+def process_parquet_file(key: str, prompt_file: str, batch_prompt_file: str,
+                         executor: ThreadPoolExecutor, run_time: datetime) -> Optional[str]:
+    """
+    Classify every post in one parquet file and upload the results.
+    Bedrock calls are submitted to the shared executor so the total number of
+    in-flight requests stays bounded across files. Returns the result key.
+    """
+    result_key = f"classifications/{key.split('/')[-1].replace('.parquet','')}_{run_time:%Y%m%d%H%M%S}.parquet"
+    writer = S3ParquetWriter(bucket_name, result_key, CLASSIFICATION_SCHEMA)
+
+    texts: List[str] = []
+    categories: List[str] = []
+    # Reposts and crossposts share text, so each distinct text is classified once per file
+    categories_by_text: Dict[str, str] = {}
+    prompt_version = prompt_fingerprint(prompt_file, batch_prompt_file)
+    try:
+        for df in iter_parquet_batches_from_s3(bucket_name, key, columns=TEXT_COLUMNS):
+            combined_texts = combine_text_columns(df)
+            new_texts = [text for text in combined_texts.drop_duplicates() if text not in categories_by_text]
+            for text in new_texts:
+                if is_low_signal(text):
+                    categories_by_text[text] = "unknown"
+            new_texts = [text for text in new_texts if text not in categories_by_text]
+            cached = executor.map(lambda text: get_cached_category(text, BEDROCK_MODEL_ID, prompt_version), new_texts)
+            for text, category in zip(new_texts, cached):
+                if category:
+                    categories_by_text[text] = category
+            new_texts = [text for text in new_texts if text not in categories_by_text]
+            chunks = [new_texts[i:i + CLASSIFY_BATCH_SIZE] for i in range(0, len(new_texts), CLASSIFY_BATCH_SIZE)]
+            chunk_responses = executor.map(
+                lambda chunk: classify_and_cache(chunk, BEDROCK_MODEL_ID, prompt_file, batch_prompt_file),
+                chunks
+            )
+            for chunk, category_responses in zip(chunks, chunk_responses):
+                categories_by_text.update(
+                    (text, category_response.category)
+                    for text, category_response in zip(chunk, category_responses)
+                )
+            texts.extend(combined_texts)
+            categories.extend(combined_texts.map(categories_by_text))
+
+            if len(texts) >= OUTPUT_ROW_GROUP_SIZE:
+                writer.write(pa.table({"combined_text": texts, "category": categories},
+                                      schema=CLASSIFICATION_SCHEMA))
+                texts, categories = [], []
+
+        if texts:
+            writer.write(pa.table({"combined_text": texts, "category": categories},
+                                  schema=CLASSIFICATION_SCHEMA))
+    except Exception:
+        writer.abort()
+        raise
+
+    if not writer.rows:
+        logger.warning("No text to classify in %s, skipping", key)
+        return None
+
+    writer.close()
+    return result_key
 
 
 # ================== Lambda Handler =================
@@ -140,79 +782,69 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     AWS Lambda handler to classify text from Parquet files in S3 using Bedrock LLM.
     Combines available text columns (e.g., Title, Post_Text) dynamically.
     """
+    # One timestamp per run: stamps every result key and the response
+    now = datetime.now(timezone.utc)
     try:
-        logger.info(f"Event received: {json.dumps(event)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Event received: %s", orjson.dumps(event).decode())
         if not bucket_name:
             raise ValueError("BUCKET_NAME environment variable not set")
 
-        parquet_files = list_parquet_files_from_s3(bucket_name, prefix="reddit_parquet/")
+        days_back = int(event.get("days_back", ANALYSIS_DAYS_BACK))
+        parquet_files = list_parquet_files_from_s3(
+            bucket_name,
+            prefix="reddit_parquet/",
+            modified_since=now - timedelta(days=days_back)
+        )
         if not parquet_files:
             logger.warning("No parquet files found in S3")
             return {
                 "statusCode": 200,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "status": "success",
                     "message": "No files found"
-                })
+                }).decode()
             }
 
         # Prompt file always located under src/prompts/
-        prompt_file = os.environ.get("PROMPT_FILE", "classify_post.jinja")
+        prompt_file, batch_prompt_file = classification_prompt_files()
         results = []
-
-        for key in parquet_files:
-            try:
-                df = read_parquet_from_s3(bucket_name, key)
-                if df.empty:
-                    logger.warning(f"File {key} is empty, skipping")
-                    continue
-
-                # Determine available text columns
-                text_columns = [col for col in ["Title", "Post_Text", "Body", "content"] if col in df.columns]
-                if not text_columns:
-                    logger.warning(f"No text columns found in {key}, skipping")
+        counters_before = cache_counters()
+
+        with ThreadPoolExecutor(max_workers=BEDROCK_CONCURRENCY) as executor, \
+                ThreadPoolExecutor(max_workers=FILE_CONCURRENCY) as file_executor:
+            futures = [
+                file_executor.submit(process_parquet_file, key, prompt_file, batch_prompt_file, executor, now)
+                for key in parquet_files
+            ]
+            for key, future in zip(parquet_files, futures):
+                try:
+                    result_key = future.result()
+                except Exception as e:
+                    logger.error("Error processing file %s: %s", key, e, exc_info=True)
                     continue
-
-                combined_texts = df[text_columns].fillna('').agg('. '.join, axis=1).str.strip()
-
-                classifications = []
-                for content in combined_texts:
-                    if not content:
-                        continue
-                    category_response = classify_text(content, BEDROCK_MODEL_ID, prompt_file)
-                    classifications.append({
-                        "combined_text": content,
-                        "category": category_response.category
-                    })
-
-                if classifications:
-                    result_df = pd.DataFrame(classifications)
-                    now = datetime.utcnow()
-                    result_key = f"classifications/{key.split('/')[-1].replace('.parquet','')}_{now.strftime('%Y%m%d%H%M%S')}.parquet"
-                    write_parquet_to_s3(result_df, bucket_name, result_key)
+                if result_key:
                     results.append(result_key)
 
-            except Exception as e:
-                logger.error(f"Error processing file {key}: {str(e)}", exc_info=True)
-                continue
+        emit_cache_metrics(counters_before)
 
         return {
             "statusCode": 200,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "status": "success",
                 "processed_files": len(results),
                 "s3_keys": results,
-                "timestamp": datetime.utcnow().isoformat()
-            }, indent=2)
+                "timestamp": now.isoformat()
+            }).decode()
         }
 
     except Exception as e:
-        logger.error(f"Error in lambda_handler: {str(e)}", exc_info=True)
+        logger.error("Error in lambda_handler: %s", e, exc_info=True)
         return {
             "statusCode": 500,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "status": "error",
                 "message": str(e),
-                "timestamp": datetime.utcnow().isoformat()
-            })
+                "timestamp": now.isoformat()
+            }).decode()
         }
@@ -1,18 +1,23 @@
-import json
 import os
 import logging
 from datetime import datetime
 from typing import Dict, Any
 
 import boto3
+import orjson
 import requests
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
 
 # ================== Logging Setup ==================
 logger = logging.getLogger()
 logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
 # ================== AWS Clients ===================
-s3_client = boto3.client('s3')
+s3_client = boto3.client('s3', config=Config(
+    tcp_keepalive=True,
+    retries={"mode": "standard", "max_attempts": 3}
+))
 bucket_name = os.environ.get("BUCKET_NAME")
 
 # ================== Postmark Config ================
@@ -22,6 +27,15 @@ FROM_EMAIL = os.environ.get("FROM_EMAIL", "sender@example.com")
 TO_EMAIL = os.environ.get("TO_EMAIL", "recipient@example.com")
 TEMPLATE_ALIAS = os.environ.get("TEMPLATE_ALIAS", "comment-notification")
 
+# One session per container: warm invocations reuse the pooled TLS connection to Postmark
+postmark_session = requests.Session()
+postmark_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+postmark_session.headers.update({
+    "Accept": "application/json",
+    "Content-Type": "application/json",
+    "X-Postmark-Server-Token": POSTMARK_SERVER_TOKEN or ""
+})
+
 def read_text_from_s3(bucket: str, key: str) -> str:
     """Read text file from S3."""
     try:
@@ -33,12 +47,6 @@ def read_text_from_s3(bucket: str, key: str) -> str:
 
 def send_postmark_email(summary_text: str) -> Dict[str, Any]:
     """Send email using Postmark API."""
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "X-Postmark-Server-Token": POSTMARK_SERVER_TOKEN
-    }
-    
     payload = {
         "From": FROM_EMAIL,
         "To": TO_EMAIL,
@@ -55,7 +63,7 @@ def send_postmark_email(summary_text: str) -> Dict[str, Any]:
     }
     
     try:
-        response = requests.post(POSTMARK_API_URL, headers=headers, json=payload)
+        response = postmark_session.post(POSTMARK_API_URL, json=payload, timeout=10)
         response.raise_for_status()
         return {"status": "success", "response": response.json()}
     except requests.exceptions.RequestException as e:
@@ -67,7 +75,9 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     AWS Lambda handler to send email with summary from S3.
     """
     try:
-        logger.info(f"Event received: {json.dumps(event)}")
+        # Serialize only when the line will actually be emitted
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Event received: %s", orjson.dumps(event).decode())
         
         if not bucket_name:
             raise ValueError("BUCKET_NAME environment variable not set")
@@ -79,11 +89,11 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if not summary_text:
             return {
                 "statusCode": 404,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "status": "error",
                     "message": "Summary file not found or empty",
                     "timestamp": datetime.utcnow().isoformat()
-                })
+                }).decode()
             }
         
         # Send email
@@ -92,30 +102,30 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if email_result["status"] == "success":
             return {
                 "statusCode": 200,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "status": "success",
                     "message": "Email sent successfully",
                     "email_response": email_result["response"],
                     "timestamp": datetime.utcnow().isoformat()
-                })
+                }).decode()
             }
         else:
             return {
                 "statusCode": 500,
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "status": "error",
                     "message": email_result["message"],
                     "timestamp": datetime.utcnow().isoformat()
-                })
+                }).decode()
             }
     
     except Exception as e:
         logger.error(f"Error in lambda_handler: {str(e)}", exc_info=True)
         return {
             "statusCode": 500,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "status": "error",
                 "message": str(e),
                 "timestamp": datetime.utcnow().isoformat()
-            })
+            }).decode()
         }
\ No newline at end of file
@@ -1,48 +1,132 @@
-import json
 import os
-import io
+import time
+import random
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import boto3
-import praw
+import orjson
 import pandas as pd
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union, TYPE_CHECKING
 from botocore.exceptions import ClientError
 
+if TYPE_CHECKING:
+    import praw
+
 # ============ Logging Setup ============
 logger = logging.getLogger()
 logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
 # ============ AWS Clients ============
-s3_client = boto3.client('s3')
 bucket_name = os.environ.get("BUCKET_NAME")
+# boto3's default session isn't thread-safe, so first-use creation is serialized
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    with _client_lock:
+        return boto3.client('s3')
 
 # ============ Reddit API Config ============
 REDDIT_CLIENT_ID = os.environ.get("REDDIT_CLIENT_ID")
 REDDIT_CLIENT_SECRET = os.environ.get("REDDIT_CLIENT_SECRET")
 REDDIT_USER_AGENT = os.environ.get("REDDIT_USER_AGENT", "lambda_reddit_scraper")
 REDDIT_SUBREDDITS = os.environ.get("REDDIT_SUBREDDITS", "UBC").split(",")
+# Subreddits fetched and uploaded at the same time
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", "8"))
+# Comment trees loaded at the same time, across all subreddits. All threads share one
+# client id's rate limit, so Reddit requests in flight stay below FETCH_CONCURRENCY + this
+COMMENT_FETCH_CONCURRENCY = int(os.environ.get("COMMENT_FETCH_CONCURRENCY", "8"))
+# Retries for a comment fetch rejected with 429; each waits for Retry-After or an exponential backoff
+COMMENT_FETCH_RETRIES = int(os.environ.get("COMMENT_FETCH_RETRIES", "4"))
+# Only the top comments are kept; the summarizer never reads more than 10 at 200 chars each
+TOP_COMMENTS_PER_POST = int(os.environ.get("TOP_COMMENTS_PER_POST", "10"))
+COMMENT_MAX_CHARS = int(os.environ.get("COMMENT_MAX_CHARS", "200"))
+
+# PRAW instances aren't thread-safe, so every thread gets its own
+_thread_local = threading.local()
+_comment_executor_lock = threading.Lock()
+
+# ============ Parquet Output Config ============
+# Content-defined chunking (pyarrow >= 21) cuts pages on content hashes, so rows shared by
+# overlapping daily windows produce byte-identical pages; older pyarrow writes as before
+PARQUET_CDC_ENABLED = (
+    os.environ.get("PARQUET_CDC_ENABLED", "true").lower() == "true"
+    and int(pa.__version__.split(".")[0]) >= 21
+)
 
 
 # ============ Core Function ============
 
-def fetch_reddit_posts(subreddit_name: str, days_back: int = 7) -> pd.DataFrame:
+def get_reddit_client() -> "praw.Reddit":
+    """Return this thread's praw.Reddit instance, creating it on first use."""
+    reddit = getattr(_thread_local, "reddit", None)
+    if reddit is None:
+        # praw is slow to import and only the fetch path needs it (not e.g. the summarizer)
+        import praw
+        reddit = praw.Reddit(
+            client_id=REDDIT_CLIENT_ID,
+            client_secret=REDDIT_CLIENT_SECRET,
+            user_agent=REDDIT_USER_AGENT
+        )
+        _thread_local.reddit = reddit
+    return reddit
+
+
+@lru_cache(maxsize=None)
+def get_comment_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by every subreddit's comment fetches, kept for warm invocations."""
+    with _comment_executor_lock:
+        return ThreadPoolExecutor(max_workers=COMMENT_FETCH_CONCURRENCY, thread_name_prefix="comments")
+
+
+def fetch_comments(post_id: str) -> List[str]:
+    """
+    Fetch the highest-scoring top-level comment bodies of one post, truncated.
+    "Load more" stubs are dropped (replace_more(limit=0)) rather than expanded,
+    since expanding them costs one extra request per stub.
+    Every thread's praw instance shares one client id's rate limit without
+    knowing about the others, so 429s are retried with backoff.
+    """
+    from prawcore.exceptions import TooManyRequests
+
+    for attempt in range(COMMENT_FETCH_RETRIES + 1):
+        try:
+            submission = get_reddit_client().submission(id=post_id)
+            submission.comments.replace_more(limit=0)
+            top = sorted(submission.comments, key=lambda c: getattr(c, "score", 0), reverse=True)
+            return [c.body[:COMMENT_MAX_CHARS] for c in top[:TOP_COMMENTS_PER_POST]]
+        except TooManyRequests as e:
+            if attempt == COMMENT_FETCH_RETRIES:
+                logger.warning(f"Rate limited fetching comments for post {post_id}, giving up after {attempt + 1} attempts")
+                return []
+            delay = float(e.retry_after) if e.retry_after else 2 ** attempt
+            # Jitter keeps the threads that were throttled together from retrying in lockstep
+            time.sleep(delay + random.uniform(0, 1))
+        except Exception as e:
+            # A deleted or otherwise failing post shouldn't sink the whole subreddit
+            logger.warning(f"Failed to fetch comments for post {post_id}: {e}")
+            return []
+
+
+def fetch_reddit_posts(subreddit_name: str, days_back: int = 7,
+                       return_format: str = "dataframe") -> Union[pd.DataFrame, List[Dict[str, Any]]]:
     """
     Fetch recent Reddit posts (and comments) from a subreddit.
-    Returns a DataFrame.
+    Returns a DataFrame, or a list of one dict per post if return_format is "records".
     """
+    if return_format not in ("dataframe", "records"):
+        raise ValueError(f"Unknown return_format: {return_format}")
     if not all([REDDIT_CLIENT_ID, REDDIT_CLIENT_SECRET, REDDIT_USER_AGENT]):
         raise ValueError("Missing Reddit credentials in environment variables.")
     
-    reddit = praw.Reddit(
-        client_id=REDDIT_CLIENT_ID,
-        client_secret=REDDIT_CLIENT_SECRET,
-        user_agent=REDDIT_USER_AGENT
-    )
-
-    subreddit = reddit.subreddit(subreddit_name)
+    subreddit = get_reddit_client().subreddit(subreddit_name)
     now = datetime.now(timezone.utc)
     cutoff = now - timedelta(days=days_back)
     
@@ -54,6 +138,7 @@ def fetch_reddit_posts(subreddit_name: str, days_back: int = 7) -> pd.DataFrame:
         "Created_UTC": [],
         "Subreddit": [],
     }
+    post_ids = []
     
     logger.info(f"Fetching posts from r/{subreddit_name} for last {days_back} days")
     count = 0
@@ -61,23 +146,21 @@ def fetch_reddit_posts(subreddit_name: str, days_back: int = 7) -> pd.DataFrame:
         post_time = datetime.fromtimestamp(post.created_utc, tz=timezone.utc)
         if post_time < cutoff:
             break
-        
-        comments = []
-        try:
-            post.comments.replace_more(limit=None)
-            comments = [c.body for c in post.comments.list()]
-        except Exception:
-            pass
-        
+
+        post_ids.append(post.id)
         posts_dict["Title"].append(post.title)
         posts_dict["Post_Text"].append(post.selftext)
         posts_dict["Post_URL"].append(post.url)
-        posts_dict["Comments"].append(comments)
         posts_dict["Created_UTC"].append(post_time.isoformat())
         posts_dict["Subreddit"].append(subreddit_name)
         count += 1
 
+    # Each comment tree is a separate request, so load them concurrently
+    posts_dict["Comments"] = list(get_comment_executor().map(fetch_comments, post_ids))
+
     logger.info(f"Fetched {count} posts from r/{subreddit_name}")
+    if return_format == "records":
+        return [dict(zip(posts_dict, values)) for values in zip(*posts_dict.values())]
     return pd.DataFrame(posts_dict)
 
 
@@ -94,15 +177,25 @@ def store_parquet_in_s3(df: pd.DataFrame, subreddit_name: str, days_back: int) -
     today_date = now.strftime('%Y_%m_%d')
     
     key = f"reddit_parquet/{subreddit_name}_{today_date}_{old_date}.parquet"
-    buffer = io.BytesIO()
-    df.to_parquet(buffer, index=False, engine="pyarrow")
-    buffer.seek(0)
+    # Write straight into an Arrow buffer; zstd shrinks the text-heavy columns well below the default snappy
+    sink = pa.BufferOutputStream()
+    pq.write_table(
+        pa.Table.from_pandas(df, preserve_index=False),
+        sink,
+        compression="zstd",
+        compression_level=3,
+        row_group_size=50_000,
+        use_dictionary=True,
+        write_statistics=True,
+        data_page_version="2.0",
+        **({"use_content_defined_chunking": True} if PARQUET_CDC_ENABLED else {})
+    )
 
     try:
-        s3_client.put_object(
+        get_s3_client().put_object(
             Bucket=bucket_name,
             Key=key,
-            Body=buffer,
+            Body=sink.getvalue().to_pybytes(),
             ContentType='application/octet-stream'
         )
         logger.info(f"Uploaded {len(df)} posts from r/{subreddit_name} to s3://{bucket_name}/{key}")
@@ -112,6 +205,15 @@ def store_parquet_in_s3(df: pd.DataFrame, subreddit_name: str, days_back: int) -
         raise
 
 
+def fetch_and_store(subreddit_name: str, days_back: int) -> str:
+    """
+    Fetch one subreddit and upload its posts; returns the S3 key (None if no posts).
+    Every thread gets its own praw.Reddit (get_reddit_client), so this is safe to run in a thread.
+    """
+    df = fetch_reddit_posts(subreddit_name, days_back)
+    return store_parquet_in_s3(df, subreddit_name, days_back)
+
+
 # ============ Lambda Handler ============
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -119,20 +221,21 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     AWS Lambda handler to fetch Reddit posts from multiple subreddits
     and store them as Parquet files in S3.
     """
-    logger.info(f"Event received: {json.dumps(event)}")
+    # Serialize only when the line will actually be emitted
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Event received: %s", orjson.dumps(event).decode())
 
     if not bucket_name:
         raise ValueError("BUCKET_NAME environment variable is not set")
 
     try:
         days_back = int(event.get("days_back", 7))
-        stored_files = []
+        subreddit_names = [name.strip() for name in REDDIT_SUBREDDITS]
 
-        for subreddit_name in REDDIT_SUBREDDITS:
-            df = fetch_reddit_posts(subreddit_name.strip(), days_back)
-            key = store_parquet_in_s3(df, subreddit_name.strip(), days_back)
-            if key:
-                stored_files.append(key)
+        # Fetching is bound by Reddit API paging and uploads by S3, so subreddits overlap well
+        with ThreadPoolExecutor(max_workers=max(1, min(FETCH_CONCURRENCY, len(subreddit_names)))) as executor:
+            keys = executor.map(lambda name: fetch_and_store(name, days_back), subreddit_names)
+            stored_files = [key for key in keys if key]
 
         result = {
             "status": "success",
@@ -144,15 +247,15 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
 
         logger.info(f"Successfully stored {len(stored_files)} files to S3.")
-        return {"statusCode": 200, "body": json.dumps(result, indent=2)}
+        return {"statusCode": 200, "body": orjson.dumps(result).decode()}
 
     except Exception as e:
         logger.error(f"Error in lambda_handler: {str(e)}", exc_info=True)
         return {
             "statusCode": 500,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "status": "error",
                 "message": str(e),
                 "timestamp": datetime.utcnow().isoformat()
-            })
+            }).decode()
         }
@@ -1,33 +1,46 @@
 import os
 import io
-import json
 import logging
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Any
 
 import boto3
+import orjson
+from botocore.config import Config
 import pandas as pd
 import numpy as np
-from tqdm import tqdm
 from jinja2 import Template
 from pydantic import BaseModel, Field
 
 
 from reddit_fetcher import fetch_reddit_posts
-from llm_classifier import classify_text
+from analyzer import (
+    BEDROCK_MODEL_ID, CLASSIFY_BATCH_SIZE, classification_prompt_files, classify_texts, is_low_signal
+)
 
 # ================== Logging ==================
 logger = logging.getLogger()
 logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
-tqdm.pandas()
-
 # ================== AWS S3 ==================
-s3_client = boto3.client("s3")
-bedrock_client = boto3.client('bedrock-runtime', region_name=os.environ.get("BEDROCK_REGION", os.environ.get("AWS_REGION", "us-east-1")))
+# Kept at module scope so warm invocations reuse the clients and their keep-alive connections
+BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    retries={"mode": "standard", "max_attempts": 3},
+    max_pool_connections=50
+)
+s3_client = boto3.client("s3", config=BOTO_CONFIG)
+bedrock_client = boto3.client('bedrock-runtime', region_name=os.environ.get("BEDROCK_REGION", os.environ.get("AWS_REGION", "us-east-1")), config=BOTO_CONFIG)
 bucket_name = os.environ.get("BUCKET_NAME")
 bedrock_region = os.environ.get("BEDROCK_REGION", os.environ.get("AWS_REGION", "us-east-1"))
+# Concurrent classification requests. They go through the analyzer's Bedrock client,
+# whose connection pool (analyzer.BOTO_CONFIG, at least 64) is sized to cover it
+CLASSIFY_CONCURRENCY = int(os.environ.get("CLASSIFY_CONCURRENCY", "16"))
+# Categories summarized at the same time; each holds one prompt of posts in memory
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", "8"))
 
 # ================== Folders ==================
 OUTPUT_FOLDER = Path("reddit_data")
@@ -39,36 +52,88 @@ OUTPUT_FOLDER.mkdir(exist_ok=True, parents=True)
 CLASSIFIED_FOLDER.mkdir(exist_ok=True, parents=True)
 SUMMARY_OUTPUT_FOLDER.mkdir(exist_ok=True, parents=True)
 
+# Summary prompt per category
+CATEGORY_PROMPT_MAP = {
+    "Computer Science": "Computer_Science.jinja",
+    "Social": "Social_Events.jinja",
+    "General Academics": "General_Academics.jinja",
+    "General Sciences": "General_Sciences.jinja",
+    "Mental Health and Wellbeing": "Mental_Health_and_Wellbeing.jinja",
+    "Math and Statistics": "Math_and_Statistics.jinja",
+    "Campus Spaces": "Campus_Spaces.jinja",
+    "Career": "Career.jinja",
+    "Business and Econ": "Business_and_Econ.jinja",
+    "Housing and Residence": "Housing_and_Residence.jinja",
+    "Admin and Logistics": "Admin_and_Logistics.jinja",
+    "Arts and Humanities": "Arts_and_Humanities.jinja",
+    "Rants": "Rants_and_Complaints.jinja",
+    "Advice and Tips": "Advice_and_Tips.jinja",
+}
+
 # ================== LLM & Output Models ==================
 class SummaryResponse(BaseModel):
     summary: str = Field(description="A concise summary of the posts for the given category.")
 
 # ================== LLM Initialization =================
+MAX_GEN_TOKENS = 1000
+
+# Request bodies differ per call only in the prompt, so the JSON around it is
+# rendered once and the orjson-escaped prompt is spliced in
+CLAUDE_BODY_TMPL = (
+    b'{"anthropic_version":"bedrock-2023-05-31","max_tokens":%d,'
+    b'"messages":[{"role":"user","content":%%s}]}' % MAX_GEN_TOKENS
+)
+LLAMA_BODY_TMPL = b'{"prompt":%%s,"max_gen_len":%d}' % MAX_GEN_TOKENS
+TITAN_BODY_TMPL = b'{"inputText":%%s,"textGenerationConfig":{"maxTokenCount":%d}}' % MAX_GEN_TOKENS
+
+def _build_claude_body(prompt: str) -> bytes:
+    return CLAUDE_BODY_TMPL % orjson.dumps(prompt)
+
+def _build_llama_body(prompt: str) -> bytes:
+    return LLAMA_BODY_TMPL % orjson.dumps(prompt)
+
+def _build_titan_body(prompt: str) -> bytes:
+    return TITAN_BODY_TMPL % orjson.dumps(prompt)
+
+# Model id prefix -> (request body builder, text extractor for one streamed chunk)
+PROVIDERS = {
+    "anthropic.claude": (
+        _build_claude_body,
+        lambda chunk: chunk['delta'].get('text', '') if chunk.get('type') == 'content_block_delta' else ''
+    ),
+    "meta.llama": (_build_llama_body, lambda chunk: chunk.get('generation') or ''),
+    "amazon.titan": (_build_titan_body, lambda chunk: chunk.get('outputText') or ''),
+}
+
+@lru_cache(maxsize=None)
+def _provider_for(model_id: str):
+    """Resolve a model id to its provider handlers once; cross-region ids like "us.anthropic..." included."""
+    region, _, rest = model_id.partition(".")
+    base_id = rest if region in ("us", "eu", "apac") else model_id
+    return next(
+        (handlers for prefix, handlers in PROVIDERS.items() if base_id.startswith(prefix)),
+        PROVIDERS["anthropic.claude"]
+    )
+
 def invoke_bedrock_model(prompt: str, model_id: str = "anthropic.claude-3-sonnet-20240229-v1:0") -> str:
-    """Invoke Bedrock model directly with boto3."""
-    if model_id.startswith("anthropic.claude"):
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "messages": [{"role": "user", "content": prompt}]
-        })
-    else:
-        body = json.dumps({"prompt": prompt, "max_gen_len": 1000})
-    
-    response = bedrock_client.invoke_model(
+    """
+    Invoke Bedrock model directly with boto3.
+    The reply is streamed, so long summaries arrive as they are generated
+    instead of the socket sitting idle until the whole reply is ready.
+    """
+    build_body, extract_chunk_text = _provider_for(model_id)
+    response = bedrock_client.invoke_model_with_response_stream(
         modelId=model_id,
-        body=body,
+        body=build_body(prompt),
         contentType="application/json"
     )
-    
-    result = json.loads(response['body'].read())
-    
-    if model_id.startswith("anthropic.claude"):
-        return result['content'][0]['text']
-    elif model_id.startswith("meta.llama"):
-        return result['generation']
-    else:
-        return str(result)
+    parts = []
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if chunk:
+            # orjson parses the raw bytes directly, skipping the decode-to-str copy
+            parts.append(extract_chunk_text(orjson.loads(chunk['bytes'])))
+    return "".join(parts)
 
 # ================== Helper Functions =================
 def format_comments(comments) -> str:
@@ -96,37 +161,79 @@ def format_comments(comments) -> str:
 
 def format_posts_for_prompt(df: pd.DataFrame, category: str, title_col="Title",
                            content_col="Post_Text", comments_col="Comments") -> str:
-    category_posts = df[df['category'] == category].copy()
+    category_posts = df[df['category'] == category]
     if len(category_posts) == 0:
         return ""
-    posts_list = []
-    for idx, row in category_posts.iterrows():
-        title = row.get(title_col, "No title")
-        content = row.get(content_col, "No content") if pd.notna(row.get(content_col)) else "No content"
-        comments = format_comments(row.get(comments_col))
-        post_text = f"""Post {len(posts_list) + 1}:
+    n = len(category_posts)
+    # Whole-column lookups instead of iterrows, which builds a Series per row
+    titles = category_posts[title_col].tolist() if title_col in category_posts else ["No title"] * n
+    if content_col in category_posts:
+        contents = category_posts[content_col].where(category_posts[content_col].notna(), "No content").tolist()
+    else:
+        contents = ["No content"] * n
+    if comments_col in category_posts:
+        comments = category_posts[comments_col].map(format_comments).tolist()
+    else:
+        comments = ["No comments"] * n
+    posts_list = [
+        f"""Post {i}:
 Title: {title}
 Content: {content}
 Comments:
-{comments}"""
-        posts_list.append(post_text)
+{post_comments}"""
+        for i, (title, content, post_comments) in enumerate(zip(titles, contents, comments), 1)
+    ]
     return "\n\n" + "\n\n---\n\n".join(posts_list)
 
-def render_prompt(prompt_file: str, posts_data: str) -> str:
+@lru_cache(maxsize=None)
+def load_template(prompt_file: str) -> Template:
+    """Read and compile a prompt template once per container."""
     with open(prompt_file, "r", encoding="utf-8") as f:
-        template = Template(f.read())
-    return template.render(posts=posts_data)
+        return Template(f.read())
+
+def render_prompt(prompt_file: str, posts_data: str) -> str:
+    return load_template(prompt_file).render(posts=posts_data)
+
+def preload_templates():
+    """Compile every category prompt up front so no request pays for it."""
+    for prompt_name in CATEGORY_PROMPT_MAP.values():
+        prompt_path = PROMPTS_DIR / prompt_name
+        if prompt_path.exists():
+            load_template(str(prompt_path))
+        else:
+            logger.warning(f"Prompt template {prompt_path} not found")
+
+preload_templates()
 
 def summarize_posts(posts_data: str, model_id: str, prompt_file: str) -> SummaryResponse:
     rendered_prompt = render_prompt(prompt_file, posts_data)
     full_prompt = f"{rendered_prompt}\n\nRespond with JSON format: {{\"summary\": \"text\"}}"
     output_text = invoke_bedrock_model(full_prompt, model_id)
     try:
-        result = json.loads(output_text.strip())
+        result = orjson.loads(output_text.strip())
         return SummaryResponse(summary=result.get("summary", output_text.strip()))
     except Exception:
         return SummaryResponse(summary=output_text.strip())
 
+def summarize_categories(df: pd.DataFrame, model_id: str) -> Dict[str, str]:
+    """
+    Summarize the posts of every category that has a prompt template.
+    Categories are independent, so they are summarized concurrently and the
+    total time is that of the slowest category rather than the sum.
+    """
+    jobs = []
+    for category, prompt_name in CATEGORY_PROMPT_MAP.items():
+        prompt_path = PROMPTS_DIR / prompt_name
+        posts_data = format_posts_for_prompt(df, category)
+        if posts_data and prompt_path.exists():
+            jobs.append((category, posts_data, str(prompt_path)))
+    if not jobs:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(SUMMARY_CONCURRENCY, len(jobs))) as executor:
+        responses = executor.map(lambda job: summarize_posts(job[1], model_id, job[2]), jobs)
+        return {job[0]: response.summary for job, response in zip(jobs, responses)}
+
 # ================== S3 Utilities =================
 def list_parquet_files_from_s3(bucket: str, prefix: str = "raw_data/"):
     paginator = s3_client.get_paginator("list_objects_v2")
@@ -152,13 +259,32 @@ def get_parquet_filename(subreddit: str, start_date: datetime, end_date: datetim
     end_str = end_date.strftime("%Y_%m_%d")
     return f"{subreddit}_{end_str}_{start_str}.parquet"
 
-def classify_posts(df: pd.DataFrame, llm_model, title_col="Title", content_col="Post_Text"):
+def classify_posts(df: pd.DataFrame, llm_model=None, title_col="Title", content_col="Post_Text"):
+    """
+    Fill df['category'] using the analyzer's batched Bedrock classifier.
+    llm_model is the Bedrock model id (defaults to the analyzer's).
+    """
     if 'category' not in df.columns or df['category'].isnull().all():
-        tqdm.pandas()
+        model_id = llm_model or BEDROCK_MODEL_ID
         combined_texts = (df[title_col].fillna('') + ". " + df[content_col].fillna('')).str.strip()
-        df['category'] = combined_texts.progress_apply(
-            lambda t: classify_text(content=t, llm_model=llm_model, prompt_file=str(PROMPTS_DIR / "classify_post.jinja")).category
-        )
+        prompt_file, batch_prompt_file = classification_prompt_files()
+        # Repeated texts are classified once and near-empty ones (e.g. ". ") not at all, as in
+        # the analyzer; CLASSIFY_BATCH_SIZE posts share each Bedrock call and the chunks are sent concurrently
+        unique_texts = combined_texts.drop_duplicates().tolist()
+        category_by_text = {text: "unknown" for text in unique_texts if is_low_signal(text)}
+        unique_texts = [text for text in unique_texts if text not in category_by_text]
+        chunks = [unique_texts[i:i + CLASSIFY_BATCH_SIZE] for i in range(0, len(unique_texts), CLASSIFY_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=CLASSIFY_CONCURRENCY) as executor:
+            chunk_responses = executor.map(
+                lambda chunk: classify_texts(chunk, model_id, prompt_file, batch_prompt_file),
+                chunks
+            )
+            category_by_text.update(
+                (text, response.category)
+                for chunk, responses in zip(chunks, chunk_responses)
+                for text, response in zip(chunk, responses)
+            )
+        df['category'] = combined_texts.map(category_by_text)
     return df
 
 # ================== Main Processing =================
@@ -173,53 +299,27 @@ def process_all_data(subreddit: str = "ubc", days_back: int = 7, llm_model=None)
     if parquet_file.exists():
         df = pd.read_parquet(parquet_file)
     else:
-        df = fetch_reddit_posts([subreddit], days_back=days_back, manual_date=today, output_folder=str(OUTPUT_FOLDER))
+        df = fetch_reddit_posts(subreddit, days_back=days_back)
         df.to_parquet(parquet_file, index=False)
 
     # Classify posts
     if llm_model is None:
-        llm_model = get_ollama_model()
+        llm_model = BEDROCK_MODEL_ID
     df = classify_posts(df, llm_model)
     df.to_parquet(classified_file, index=False)
 
     # Summarize per category
-    category_prompt_map = {
-        "Computer Science": "Computer_Science.jinja",
-        "Social": "Social_Events.jinja",
-        "General Academics": "General_Academics.jinja",
-        "General Sciences": "General_Sciences.jinja",
-        "Mental Health and Wellbeing": "Mental_Health_and_Wellbeing.jinja",
-        "Math and Statistics": "Math_and_Statistics.jinja",
-        "Campus Spaces": "Campus_Spaces.jinja",
-        "Career": "Career.jinja",
-        "Business and Econ": "Business_and_Econ.jinja",
-        "Housing and Residence": "Housing_and_Residence.jinja",
-        "Admin and Logistics": "Admin_and_Logistics.jinja",
-        "Arts and Humanities": "Arts_and_Humanities.jinja",
-        "Rants": "Rants_and_Complaints.jinja",
-        "Advice and Tips": "Advice_and_Tips.jinja",
-    }
-
-    from summary_pipeline import process_all_prompts  # your existing summarization code
-    summaries = process_all_prompts(
-        df=df,
-        category_prompt_map=category_prompt_map,
-        prompts_dir=str(PROMPTS_DIR),
-        llm_model=llm_model,
-        output_dir=str(SUMMARY_OUTPUT_FOLDER),
-        verbose=False
-    )
-    return summaries
+    return summarize_categories(df, llm_model)
 
 # ================== Lambda Handler =================
 def lambda_handler(event: Dict[str, Any], context: Any):
     model_id = os.environ.get("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
-    summaries = process_all_data(subreddit="ubc", days_back=7, model_id=model_id)
+    summaries = process_all_data(subreddit="ubc", days_back=7, llm_model=model_id)
     return {
         "statusCode": 200,
-        "body": json.dumps({
+        "body": orjson.dumps({
             "status": "success",
             "summaries": summaries,
             "timestamp": datetime.utcnow().isoformat()
-        }, indent=2)
+        }).decode()
     }
\ No newline at end of file
@@ -0,0 +1,17 @@
+import os
+import pytest
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config):
+    """
+    Skip .pytest_cache writes on local runs. Only runs with CI set record
+    lastfailed, so --lf/--ff need CI=1 on the failing run too.
+    """
+    if os.environ.get("CI"):
+        return
+    # lastfailed/nodeids are written by these two plugins at session end
+    for name in ("lfplugin", "nfplugin"):
+        plugin = config.pluginmanager.get_plugin(name)
+        if plugin is not None:
+            config.pluginmanager.unregister(plugin)
@@ -0,0 +1,288 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from jinja2 import Template
+
+import analyzer
+
+PROMPT_FILES = sorted(p.name for p in (Path(analyzer.__file__).parent / "prompts").glob("*.jinja"))
+
+
+@pytest.mark.parametrize("prompt_file", PROMPT_FILES)
+@pytest.mark.parametrize("content", [
+    "Where can I study late on campus?",
+    "Line one\nLine two\r\nwith {{ braces }} and {% tags %}\n",
+    ""
+])
+def test_render_prompt_matches_jinja(prompt_file, content):
+    """Test the literal fast path renders exactly what Jinja would"""
+    expected = Template(analyzer._read_prompt_source(prompt_file)).render(content=content)
+    assert analyzer.render_prompt(prompt_file, content) == expected
+
+
+def test_bundled_classification_prompts_take_literal_path():
+    """Test the classification prompts don't fall back to Jinja"""
+    assert analyzer._literal_template_parts("classify_post.jinja") is not None
+    assert analyzer._literal_template_parts("classify_posts_batch.jinja") is not None
+
+
+@pytest.fixture
+def fake_bedrock(monkeypatch):
+    """Replace Bedrock with canned replies: the batch reply first, then per-post fallbacks"""
+    calls = []
+
+    def configure(batch_reply, single_reply='{"category": "unknown"}'):
+        def invoke(prompt, model_id, **kwargs):
+            calls.append(prompt)
+            return batch_reply if len(calls) == 1 else single_reply
+        monkeypatch.setattr(analyzer, "invoke_bedrock_model", invoke)
+        return calls
+    return configure
+
+
+BATCH_REPLY = '[{"id": 1, "category": "Social"}, {"id": 2, "category": "Career"}]'
+
+
+@pytest.mark.parametrize("reply", [
+    pytest.param(BATCH_REPLY, id="bare"),
+    pytest.param(f"```json\n{BATCH_REPLY}\n```", id="fenced"),
+    pytest.param(f"Here you go: {BATCH_REPLY}", id="prefaced"),
+    pytest.param("See [1] below.\n" + BATCH_REPLY, id="bracket_in_preamble"),
+])
+def test_classify_texts_parses_batch_reply(fake_bedrock, reply):
+    """Test wrapped batch replies are parsed with a single Bedrock call"""
+    calls = fake_bedrock(reply)
+    results = analyzer.classify_texts(["post one", "post two"], "model",
+                                      "classify_post.jinja", "classify_posts_batch.jinja")
+    assert [r.category for r in results] == ["Social", "Career"]
+    assert len(calls) == 1
+
+
+def test_classify_texts_keeps_complete_entries_of_truncated_reply(fake_bedrock):
+    """Test a cut-off reply keeps its complete entries and only falls back for the rest"""
+    calls = fake_bedrock('[{"id": 1, "category": "Social"}, {"id": 2, "categ', '{"category": "Career"}')
+    results = analyzer.classify_texts(["post one", "post two"], "model",
+                                      "classify_post.jinja", "classify_posts_batch.jinja")
+    assert [r.category for r in results] == ["Social", "Career"]
+    assert len(calls) == 2
+
+
+def test_classify_and_cache_stores_only_known_categories(monkeypatch):
+    """Test fallback labels and defaults aren't written to the category cache"""
+    labels = ["social", "Here is the category:", "Unknown", "Career"]
+    monkeypatch.setattr(analyzer, "classify_texts",
+                        lambda contents, *args: [analyzer.CategoryResponse(category=c) for c in labels])
+    stored = []
+    monkeypatch.setattr(analyzer, "put_cached_category",
+                        lambda text, model_id, prompt_version, category: stored.append((text, category)))
+    analyzer.classify_and_cache(["a", "b", "c", "d"], "model",
+                                "classify_post.jinja", "classify_posts_batch.jinja")
+    assert stored == [("a", "Social"), ("d", "Career")]
+
+
+def test_category_cache_key_depends_on_prompt():
+    """Test the prompt sources are part of the category cache key"""
+    version = analyzer.prompt_fingerprint("classify_post.jinja", "classify_posts_batch.jinja")
+    other = analyzer.prompt_fingerprint("classify_post.jinja", "Career.jinja")
+    assert version != other
+    assert (analyzer.category_cache_key("text", "model", version)
+            != analyzer.category_cache_key("text", "model", other))
+
+
+@pytest.mark.parametrize("text,expected", [
+    pytest.param('{"category": "Social"}', {"category": "Social"}, id="bare"),
+    pytest.param('Sure! Here it is: {"category": "Career"}', {"category": "Career"}, id="preamble"),
+    pytest.param('Using {braces} here. {"category": "Rants"} done }', {"category": "Rants"}, id="stray_braces"),
+    pytest.param('{"category": "Social"} and {"category": "Career"}', {"category": "Social"}, id="first_wins"),
+    pytest.param('[1, 2] then {"category": "Career"}', {"category": "Career"}, id="skips_non_object"),
+    pytest.param('{"category": "Soc', None, id="truncated"),
+    pytest.param("no json at all", None, id="none"),
+])
+def test_extract_json_object(text, expected):
+    """Test the first complete JSON object is pulled out of a reply"""
+    assert analyzer.extract_json_object(text) == expected
+
+
+@pytest.mark.parametrize("reply,expected", [
+    pytest.param('{"category": "Career"}', "Career", id="json"),
+    pytest.param('I think: {"category": "Housing and Residence"}.', "Housing and Residence", id="preamble_json"),
+    pytest.param("The category is mental health and wellbeing", "Mental Health and Wellbeing", id="free_text"),
+    pytest.param("Computer Science, not General Sciences", "Computer Science", id="first_named"),
+    pytest.param("Business and Econ", "Business and Econ", id="exact_name"),
+    pytest.param('{"category": null}', '{"category": null}', id="null_category"),
+    pytest.param('{"category": 5} Career', "Career", id="numeric_category"),
+    pytest.param('{"other": "x"}', "Unknown", id="missing_category"),
+])
+def test_classify_text_reply_parsing(monkeypatch, reply, expected):
+    """Test JSON, embedded JSON and free-text (CATEGORY_RE) replies map to a string category"""
+    monkeypatch.setattr(analyzer, "invoke_bedrock_model", lambda *args, **kwargs: reply)
+    assert analyzer.classify_text("post", "model", "classify_post.jinja").category == expected
+
+
+@pytest.mark.parametrize("text,expected", [
+    pytest.param("[removed]. ", True, id="removed"),
+    pytest.param("[deleted]. [deleted]", True, id="deleted"),
+    pytest.param("Help?. ", True, id="short_title"),
+    pytest.param("", True, id="empty"),
+    pytest.param("Best place to study late?. [removed]", False, id="title_with_removed_body"),
+    pytest.param("Where can I find cheap housing near campus?", False, id="real_post"),
+])
+def test_is_low_signal(text, expected):
+    """Test removed/deleted placeholders and very short posts are skipped"""
+    assert analyzer.is_low_signal(text) is expected
+
+
+@pytest.mark.parametrize("reply,expected,expected_calls", [
+    pytest.param('[{"id": 1, "category": "Social"}, {"id": 2, "category": "Career"}, {"id": 3, "category": "Rants"}]',
+                 ["Social", "Career", "Rants"], 1, id="in_order"),
+    pytest.param('[{"id": 3, "category": "Rants"}, {"id": 1, "category": "Social"}, {"id": 2, "category": "Career"}]',
+                 ["Social", "Career", "Rants"], 1, id="reordered"),
+    pytest.param('[{"id": 1, "category": "Social"}, {"id": 3, "category": "Rants"}]',
+                 ["Social", "unknown", "Rants"], 2, id="missing_id"),
+    pytest.param('[{"id": 1, "category": "Social"}, {"id": 9, "category": "Career"}, {"id": "2", "category": "Rants"}]',
+                 ["Social", "unknown", "unknown"], 3, id="bad_ids"),
+])
+def test_classify_texts_aligns_by_id(fake_bedrock, reply, expected, expected_calls):
+    """Test batch replies are matched to posts by id, with per-post fallback for gaps"""
+    calls = fake_bedrock(reply)
+    results = analyzer.classify_texts(["post one", "post two", "post three"], "model",
+                                      "classify_post.jinja", "classify_posts_batch.jinja")
+    assert [r.category for r in results] == expected
+    assert len(calls) == expected_calls
+
+
+class _FakeBody:
+    def __init__(self, data=None, error=None):
+        self.data, self.error = data, error
+
+    def read(self):
+        if self.error:
+            raise self.error
+        return self.data
+
+
+@pytest.mark.parametrize("body,expected", [
+    pytest.param(_FakeBody(b'{"category": "social"}'), "Social", id="hit"),
+    pytest.param(_FakeBody(b'{"category": "Here is the category:"}'), None, id="unknown_label"),
+    pytest.param(_FakeBody(b'{"category": null}'), None, id="null"),
+    pytest.param(_FakeBody(b'["Social"]'), None, id="not_a_dict"),
+    pytest.param(_FakeBody(b'{"category": "Soc'), None, id="truncated"),
+    pytest.param(_FakeBody(error=TimeoutError("read timed out")), None, id="read_timeout"),
+])
+def test_get_cached_category_degrades_to_miss(monkeypatch, body, expected):
+    """Test unreadable or invalid cache objects are misses, not errors"""
+    class FakeS3:
+        exceptions = SimpleNamespace(NoSuchKey=KeyError)
+
+        def get_object(self, **kwargs):
+            return {"Body": body, "LastModified": datetime.now(timezone.utc)}
+
+    fake_s3 = FakeS3()
+    monkeypatch.setattr(analyzer, "get_s3_client", lambda: fake_s3)
+    assert analyzer.get_cached_category("text", "model", "v1") == expected
+
+
+def test_classify_and_cache_tolerates_non_string_category(monkeypatch):
+    """Test a non-string category is returned but not cached"""
+    monkeypatch.setattr(analyzer, "classify_texts",
+                        lambda contents, *args: [analyzer.CategoryResponse(category=None)])
+    stored = []
+    monkeypatch.setattr(analyzer, "put_cached_category", lambda *args: stored.append(args))
+    analyzer.classify_and_cache(["a"], "model", "classify_post.jinja", "classify_posts_batch.jinja")
+    assert stored == []
+
+
+class _RecordingWriter:
+    """Stands in for S3ParquetWriter, keeping each written row group"""
+    instances = []
+
+    def __init__(self, bucket, key, schema):
+        self.key, self.tables, self.rows, self.closed = key, [], 0, False
+        _RecordingWriter.instances.append(self)
+
+    def write(self, table):
+        self.tables.append(table.to_pydict())
+        self.rows += table.num_rows
+
+    def close(self):
+        self.closed = True
+
+    def abort(self):
+        pass
+
+
+def test_process_parquet_file(monkeypatch):
+    """Test dedup, low-signal labelling, cache hits, batching and row-group flushing end to end"""
+    housing = ("Housing near campus", "Any tips for first years?")
+    batches = [
+        pd.DataFrame([housing, housing, ("[removed]", ""), ("Cached post title", "cached body")],
+                     columns=["Title", "Post_Text"]),
+        pd.DataFrame([housing, ("CPSC 110 question", "How do I recurse?"),
+                      ("Looking for a study group", "Anyone in MATH 100?")],
+                     columns=["Title", "Post_Text"]),
+    ]
+    monkeypatch.setattr(analyzer, "iter_parquet_batches_from_s3", lambda bucket, key, columns: iter(batches))
+    monkeypatch.setattr(analyzer, "get_cached_category",
+                        lambda text, model_id, version: "Career" if text.startswith("Cached") else None)
+    monkeypatch.setattr(analyzer, "put_cached_category", lambda *args: None)
+    _RecordingWriter.instances.clear()
+    monkeypatch.setattr(analyzer, "S3ParquetWriter", _RecordingWriter)
+    monkeypatch.setattr(analyzer, "OUTPUT_ROW_GROUP_SIZE", 4)
+    monkeypatch.setattr(analyzer, "CLASSIFY_BATCH_SIZE", 10)
+
+    calls = []
+
+    def invoke(prompt, model_id, **kwargs):
+        calls.append(prompt)
+        if "Post 1:" in prompt:
+            return ('[{"id": 2, "category": "Math and Statistics"}, '
+                    '{"id": 1, "category": "Computer Science"}]')
+        return '{"category": "Housing and Residence"}'
+    monkeypatch.setattr(analyzer, "invoke_bedrock_model", invoke)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        result_key = analyzer.process_parquet_file(
+            "raw_data/ubc.parquet", "classify_post.jinja", "classify_posts_batch.jinja",
+            executor, datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        )
+
+    assert result_key == "classifications/ubc_20260102030405.parquet"
+    writer, = _RecordingWriter.instances
+    assert writer.closed
+    # First batch reaches OUTPUT_ROW_GROUP_SIZE and is flushed on its own; the rest goes out at the end
+    assert [len(table["category"]) for table in writer.tables] == [4, 3]
+    assert [category for table in writer.tables for category in table["category"]] == [
+        "Housing and Residence", "Housing and Residence", "unknown", "Career",
+        "Housing and Residence", "Computer Science", "Math and Statistics",
+    ]
+    assert writer.tables[0]["combined_text"][2] == "[removed]."
+    # One single-post call for the housing text (reused for both duplicates and the next batch),
+    # one batched call for the two new texts; nothing for the removed or cached posts
+    assert len(calls) == 2
+
+
+def test_invoke_bedrock_model_caches_by_prompt_hash(monkeypatch):
+    """Test repeated prompts hit the in-process cache, which holds hashes rather than prompts"""
+    calls = []
+    monkeypatch.setattr(analyzer, "_invoke_bedrock_model_uncached",
+                        lambda prompt, *args: calls.append(prompt) or f"reply {len(calls)}")
+    monkeypatch.setattr(analyzer, "_response_cache", analyzer.OrderedDict())
+    monkeypatch.setattr(analyzer, "RESPONSE_CACHE_SIZE", 2)
+    before = analyzer.cache_counters()
+
+    assert analyzer.invoke_bedrock_model("a" * 1000, "model") == "reply 1"
+    assert analyzer.invoke_bedrock_model("a" * 1000, "model") == "reply 1"
+    analyzer.invoke_bedrock_model("b", "model")
+    analyzer.invoke_bedrock_model("c", "model")
+    # "a" was least recently used and has been evicted
+    assert analyzer.invoke_bedrock_model("a" * 1000, "model") == "reply 4"
+
+    assert len(calls) == 4
+    assert all(len(key) == 64 for key in analyzer._response_cache)
+    after = analyzer.cache_counters()
+    assert after["ResponseCacheHits"] - before["ResponseCacheHits"] == 1
+    assert after["ResponseCacheMisses"] - before["ResponseCacheMisses"] == 4
@@ -0,0 +1,144 @@
+import pytest
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import orjson
+import requests
+
+# The module-level boto3 client is replaced in every test, so skip the botocore bootstrap
+with patch("boto3.client", return_value=MagicMock()):
+    import emailer
+
+# Same shape as events/emailer-event.json
+SCHEDULED_EVENT = {
+    "source": "aws.events",
+    "detail-type": "Scheduled Event",
+    "detail": {}
+}
+SUMMARY_KEY = "summaries/all_categories_summary.txt"
+POSTMARK_RESPONSE = {"ErrorCode": 0, "MessageID": "abc-123"}
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """The handler module, so patches target the object rather than a dotted path"""
+    return emailer
+
+
+@pytest.fixture(scope="session")
+def lambda_context():
+    """Mock Lambda context (built once; no test mutates it)"""
+    return SimpleNamespace(
+        function_name="test-function",
+        function_version="1",
+        invoked_function_arn="arn:aws:lambda:us-west-2:123456789012:function:test-function",
+        memory_limit_in_mb=128,
+        get_remaining_time_in_millis=lambda: 30000
+    )
+
+
+def _s3_body(text: str) -> MagicMock:
+    """get_object side effect returning text as a fresh streaming body"""
+    return MagicMock(side_effect=lambda **kwargs: {"Body": SimpleNamespace(read=lambda: text.encode("utf-8"))})
+
+
+def _postmark_response(payload=POSTMARK_RESPONSE, status_error=None) -> SimpleNamespace:
+    """Response from postmark_session.post; status_error is raised by raise_for_status"""
+    def raise_for_status():
+        if status_error:
+            raise status_error
+    return SimpleNamespace(raise_for_status=raise_for_status, json=lambda: payload)
+
+
+@dataclass
+class _S3Stub:
+    """Minimal S3 client stand-in; the handler only calls get_object"""
+    get_object: Any = field(default_factory=lambda: _s3_body("Weekly summary"))
+
+
+@dataclass
+class _PostmarkStub:
+    """Stand-in for postmark_session; the handler only calls post"""
+    post: Any = field(default_factory=lambda: MagicMock(return_value=_postmark_response()))
+
+
+@pytest.fixture(autouse=True)
+def stubs(monkeypatch, app_module):
+    """Configured bucket and fresh S3/Postmark stubs for every test"""
+    s3, postmark = _S3Stub(), _PostmarkStub()
+    monkeypatch.setattr(app_module, "bucket_name", "test-bucket")
+    monkeypatch.setattr(app_module, "s3_client", s3)
+    monkeypatch.setattr(app_module, "postmark_session", postmark)
+    return SimpleNamespace(s3=s3, postmark=postmark)
+
+
+def _assert_ok(response, **expected):
+    """Check the status code (200 unless given) and body fields; return the parsed body"""
+    assert response["statusCode"] == expected.pop("statusCode", 200)
+    # orjson.loads takes str as well as bytes, so the body needs no encoding first
+    body = orjson.loads(response["body"])
+    for key, value in expected.items():
+        assert body[key] == value
+    assert "timestamp" in body
+    return body
+
+
+@pytest.mark.parametrize(
+    "bucket,s3_get,postmark_post,expected_status,expected_body,expected_posts",
+    [
+        pytest.param("test-bucket", None, None, 200,
+                     {"status": "success", "message": "Email sent successfully",
+                      "email_response": POSTMARK_RESPONSE}, 1,
+                     id="success"),
+        pytest.param("test-bucket", MagicMock(side_effect=Exception("S3 error")), None, 404,
+                     {"status": "error", "message": "Summary file not found or empty"}, 0,
+                     id="s3_error"),
+        pytest.param("test-bucket", _s3_body(""), None, 404,
+                     {"status": "error", "message": "Summary file not found or empty"}, 0,
+                     id="empty_summary"),
+        pytest.param("", None, None, 500,
+                     {"status": "error", "message": "BUCKET_NAME environment variable not set"}, 0,
+                     id="no_bucket"),
+        pytest.param("test-bucket", None, MagicMock(side_effect=requests.ConnectionError("Postmark down")), 500,
+                     {"status": "error", "message": "Postmark down"}, 1,
+                     id="postmark_error"),
+        pytest.param("test-bucket", None,
+                     MagicMock(return_value=_postmark_response(status_error=RuntimeError("Unexpected error"))), 500,
+                     {"status": "error", "message": "Unexpected error"}, 1,
+                     id="exception"),
+    ]
+)
+def test_lambda_handler(monkeypatch, app_module, stubs, lambda_context,
+                        bucket, s3_get, postmark_post, expected_status, expected_body, expected_posts):
+    """Test emailer responses across bucket, S3, Postmark and error cases"""
+    monkeypatch.setattr(app_module, "bucket_name", bucket)
+    if s3_get is not None:
+        s3_get.reset_mock()
+        stubs.s3.get_object = s3_get
+    if postmark_post is not None:
+        postmark_post.reset_mock()
+        stubs.postmark.post = postmark_post
+
+    # Invoke handler
+    response = app_module.lambda_handler(dict(SCHEDULED_EVENT), lambda_context)
+
+    # Assertions
+    _assert_ok(response, statusCode=expected_status, **expected_body)
+    assert stubs.postmark.post.call_count == expected_posts
+    if bucket:
+        stubs.s3.get_object.assert_called_once_with(Bucket=bucket, Key=SUMMARY_KEY)
+
+
+def test_send_postmark_email_payload(stubs):
+    """Test the summary is sent as the template's message and body"""
+    result = emailer.send_postmark_email("Weekly summary")
+
+    assert result == {"status": "success", "response": POSTMARK_RESPONSE}
+    (url,), kwargs = stubs.postmark.post.call_args
+    assert url == emailer.POSTMARK_API_URL
+    assert kwargs["timeout"] == 10
+    model = kwargs["json"]["TemplateModel"]
+    assert model["message"] == model["body"] == "Weekly summary"
+    assert kwargs["json"]["TemplateAlias"] == emailer.TEMPLATE_ALIAS